@@ -1,6 +1,6 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Index, text
 from sqlalchemy.orm import relationship
-from datetime import datetime, timezone
+from sqlalchemy.sql import func
 from database import Base
 
 class User(Base):
@@ -29,9 +29,11 @@ class User(Base):
     #Timestamps track when user was created/updates
 
 
-    #created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
-    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
-    updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc), nullable=False)
+    # server_default/onupdate push timestamping to the database - the
+    # INSERT/UPDATE no longer serializes a Python datetime over the wire
+    # and the DB clock is the single source of truth
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
 
 
     # Relationship - links to MFASecret table
@@ -70,14 +72,20 @@ class MFASecret(Base):
     is_active = Column(Boolean, default=False, nullable=False)
     
     # When was MFA verified/activated?
-    verified_at = Column(DateTime, nullable=True)
+    verified_at = Column(DateTime(timezone=True), nullable=True)
     
-    # When was this secret created?
-    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
+    # When was this secret created? (stamped by the database)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     
     # Relationship - links back to User table
     # mfa_secret.user gives you the User object
     user = relationship("User", back_populates="mfa_secret")
+
+    # Covers the register/login probes that filter on (user_id, is_active)
+    # - the planner answers them from the index without touching the heap
+    __table_args__ = (
+        Index("ix_mfa_secrets_user_active", "user_id", "is_active"),
+    )
     
     def __repr__(self):
         """String representation of MFASecret object (for debugging)"""
@@ -102,18 +110,35 @@ class BackupCode(Base):
     
     # Hashed backup code (using bcrypt like passwords)
     code_hash = Column(String(255), nullable=False)
+
+    # Peppered SHA-256 of the plaintext code (hex). Indexed so recovery
+    # finds its candidate row in one query; the bcrypt hash above is
+    # still what actually authenticates. NULL on rows written before
+    # this column existed - those fall back to the scan path.
+    lookup_hash = Column(String(64), nullable=True, index=True)
     
     # Has this code been used?
     used = Column(Boolean, default=False, nullable=False)
     
     # When was it used?
-    used_at = Column(DateTime, nullable=True)
+    used_at = Column(DateTime(timezone=True), nullable=True)
     
-    # When was this code created?
-    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
+    # When was this code created? (stamped by the database)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     
     # Relationship - links back to User
     user = relationship("User", back_populates="backup_codes")
+
+    # Partial index for recovery: verify-backup only ever scans unused
+    # codes, and used ones accumulate forever. Postgres-only; other
+    # dialects ignore the WHERE and build a plain composite index.
+    __table_args__ = (
+        Index(
+            "ix_backup_codes_user_unused",
+            "user_id",
+            postgresql_where=text("used = false")
+        ),
+    )
     
     def __repr__(self):
         """String representation for debugging"""
@@ -0,0 +1,77 @@
+"""
+Chunked user prefetch helper.
+
+Any endpoint that iterates many users (admin listings, bulk exports)
+would otherwise fall into the one-SELECT-per-user pattern. This module
+primes a per-session identity cache in chunks so downstream lookups for
+the same session are free.
+
+The cache lives in `db.info["user_cache"]` - SQLAlchemy's per-session
+scratch dict - so it is dropped automatically when the session closes
+and can never leak between requests.
+"""
+
+from itertools import islice
+from typing import AsyncIterator, Dict, Iterable
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import User
+
+
+def _session_user_cache(db: AsyncSession) -> Dict[int, User]:
+    """Return (creating if needed) this session's id -> User cache."""
+    return db.info.setdefault("user_cache", {})
+
+
+def get_cached_user(db: AsyncSession, user_id: int):
+    """
+    Look up a user in the session's prefetch cache.
+
+    Returns the cached User or None. Callers fall back to a normal
+    query on a miss - this never issues SQL itself.
+    """
+    return _session_user_cache(db).get(user_id)
+
+
+async def prefetch_users(user_ids: Iterable[int], db: AsyncSession, chunk_size: int = 100) -> AsyncIterator[User]:
+    """
+    Lazily fetch users in chunks, priming the session cache as we go.
+
+    Instead of one SELECT per user, each chunk is loaded with a single
+    `WHERE id IN (...)` query - a chunk_size-fold reduction in DB hits
+    for bulk iteration. Users are yielded in the order their ids were
+    given; unknown ids are skipped.
+
+    Usage:
+        async for user in prefetch_users(ids, db):
+            ...
+
+    Args:
+        user_ids: Iterable of user ids (may be lazy/unbounded)
+        db: Database session
+        chunk_size: How many users to load per round trip
+
+    Yields:
+        User objects in input order
+    """
+    cache = _session_user_cache(db)
+    ids = iter(user_ids)
+
+    while True:
+        chunk = list(islice(ids, chunk_size))
+        if not chunk:
+            break
+
+        # Only hit the database for ids we haven't seen this session
+        missing = [uid for uid in chunk if uid not in cache]
+        if missing:
+            result = await db.execute(select(User).where(User.id.in_(missing)))
+            for user in result.scalars():
+                cache[user.id] = user
+
+        for uid in chunk:
+            user = cache.get(uid)
+            if user is not None:
+                yield user
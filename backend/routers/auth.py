@@ -1,24 +1,152 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Header
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Request, status, Header
+from sqlalchemy import and_, delete, exists, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, load_only
 from database import get_db
 from models import User, MFASecret, BackupCode
-from schemas import UserRegister, UserLogin, Token, UserResponse, MFASetupResponse, MFAVerify, BackupCodeVerify
-from auth import get_password_hash, verify_password, create_access_token, create_refresh_token, decode_access_token
+from routers._userprefetch import get_cached_user
+from schemas import UserRegister, UserLogin, Token, UserResponse, MFASetupResponse, MFAVerify, BackupCodeVerify, MFA_TOKEN_VALIDATOR
+from pydantic_core import ValidationError as _CoreValidationError
+from auth import get_password_hash, verify_password, password_needs_rehash, create_access_token, create_refresh_token, decode_access_token, decode_token_identity
 from mfa import generate_totp_secret, encrypt_secret, decrypt_secret, generate_qr_code, verify_totp_token
+from config import get_settings
 from datetime import datetime, timezone, timedelta
+import asyncio
+import hashlib
+import hmac
+import logging
 import secrets
+import threading
+import time
 import bcrypt
+from cachetools import TTLCache
+from slowapi import Limiter
+from slowapi.util import get_remote_address
 from typing import Optional
 
+settings = get_settings()
+
+logger = logging.getLogger(__name__)
+
+# Per-client-IP rate limiter. The credential endpoints are the only ones
+# worth brute-forcing AND the most expensive to serve (KDF per attempt),
+# so throttling them protects CPU and accounts at once. main.py attaches
+# this limiter to app.state and installs the 429 handler.
+limiter = Limiter(key_func=get_remote_address)
+
 # Create router with prefix and tags
 router = APIRouter(
     prefix="/api/auth",  # All routes start with /api/auth
     tags=["Authentication"]  # Groups endpoints in API docs
 )
 
+# Hashed once at import and verified against whenever login hits an
+# unknown username. Without this, missing users got an instant 401 while
+# real users paid for a full password hash - a timing oracle that lets
+# attackers enumerate valid usernames by measuring response time. Also
+# makes login cost deterministic (exactly one hash per attempt), which
+# keeps thread-pool sizing predictable. Random input so the dummy can
+# never accidentally match a submitted password.
+_DUMMY_HASH = get_password_hash(secrets.token_urlsafe(32))
+
+# Pepper for the indexed backup-code lookup hash, pre-encoded once
+_BACKUP_PEPPER = settings.backup_code_pepper.encode('utf-8')
+
+
+def _backup_lookup_hash(code: str) -> str:
+    """Peppered SHA-256 digest used to index backup codes (see models)."""
+    return hmac.new(_BACKUP_PEPPER, code.encode('utf-8'), 'sha256').hexdigest()
+
+# Short-lived map of bearer-token digest -> (user id, token exp), so
+# repeat requests with the same token skip JWT claim handling in
+# get_current_user and go straight to a primary-key fetch. Keyed on a
+# blake2b digest so raw tokens never sit in memory; the exp travels with
+# the entry and is re-checked on every hit, so a token can never outlive
+# its expiry through the cache (same invariant as _jwt_cache in auth.py).
+# The User row itself is deliberately NOT cached - the MFA endpoints
+# mutate it through the session, so we always hand back a live ORM
+# instance.
+_token_user_cache: TTLCache = TTLCache(maxsize=10000, ttl=60)
+_token_user_lock = threading.Lock()
+
+# Constant error responses, built once. The failed-auth paths are exactly
+# where credential-stuffing traffic concentrates - raising these
+# singletons skips a dict + exception allocation per rejected request.
+_BEARER_HEADERS = {"WWW-Authenticate": "Bearer"}
+_BAD_CREDENTIALS = HTTPException(
+    status_code=status.HTTP_401_UNAUTHORIZED,
+    detail="Invalid username or password",
+    headers=_BEARER_HEADERS
+)
+_MFA_TOKEN_REQUIRED = HTTPException(
+    status_code=status.HTTP_401_UNAUTHORIZED,
+    detail="MFA token required. Please provide mfa_token in request body.",
+    headers=_BEARER_HEADERS
+)
+_INVALID_MFA_TOKEN = HTTPException(
+    status_code=status.HTTP_401_UNAUTHORIZED,
+    detail="Invalid MFA token",
+    headers=_BEARER_HEADERS
+)
+_AUTH_HEADER_MISSING = HTTPException(
+    status_code=status.HTTP_401_UNAUTHORIZED,
+    detail="Authorization header missing",
+    headers=_BEARER_HEADERS
+)
+_BAD_AUTH_FORMAT = HTTPException(
+    status_code=status.HTTP_401_UNAUTHORIZED,
+    detail="Invalid authorization header format. Expected: Bearer <token>",
+    headers=_BEARER_HEADERS
+)
+_INVALID_TOKEN = HTTPException(
+    status_code=status.HTTP_401_UNAUTHORIZED,
+    detail="Invalid or expired token",
+    headers=_BEARER_HEADERS
+)
+_MISSING_USER_ID = HTTPException(
+    status_code=status.HTTP_401_UNAUTHORIZED,
+    detail="Invalid token payload: missing user ID",
+    headers=_BEARER_HEADERS
+)
+_USER_NOT_FOUND = HTTPException(
+    status_code=status.HTTP_404_NOT_FOUND,
+    detail="User not found"
+)
+
+# Decrypted TOTP secrets, cached briefly per user id. A login followed by
+# a verify inside the same TOTP window decrypts the identical ciphertext
+# twice; the 30-second TTL matches one TOTP step so nothing stale ever
+# feeds a verification. Every code path that rotates or removes a secret
+# drops the entry via _drop_cached_secret below.
+_totp_secret_cache: TTLCache = TTLCache(maxsize=10000, ttl=30)
+_totp_secret_lock = threading.Lock()
+
+
+async def _decrypted_secret_for(user_id: int, mfa_secret: MFASecret) -> str:
+    """Decrypt mfa_secret.secret_key, reusing a recent decryption if any.
+
+    Cache hits return immediately on the event loop; a miss runs the
+    AES-GCM (or legacy Fernet) work on the executor so decryption never
+    stalls other requests.
+    """
+    with _totp_secret_lock:
+        secret = _totp_secret_cache.get(user_id)
+    if secret is None:
+        secret = await asyncio.to_thread(decrypt_secret, mfa_secret.secret_key)
+        with _totp_secret_lock:
+            _totp_secret_cache[user_id] = secret
+    return secret
+
+
+def _drop_cached_secret(user_id: int) -> None:
+    """Forget a user's cached plaintext secret (rotate/disable/reset)."""
+    with _totp_secret_lock:
+        _totp_secret_cache.pop(user_id, None)
+
 
 @router.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-def register_user(user_data: UserRegister, db: Session = Depends(get_db)):
+@limiter.limit(f"{settings.rate_limit_per_minute}/minute")
+async def register_user(request: Request, user_data: UserRegister, db: AsyncSession = Depends(get_db)):
     """
     Register a new user account.
     
@@ -39,71 +167,66 @@ def register_user(user_data: UserRegister, db: Session = Depends(get_db)):
         HTTPException 400: Username or email already exists
     """
     
-    # Check if username already taken
-    existing_user = db.query(User).filter(User.username == user_data.username).first()
+    # Answer every duplicate question in ONE round trip: uniqueness of
+    # both columns (each uniquely indexed, so OR is index-driven) AND
+    # whether a duplicate is stuck mid-MFA-setup. The outer join only
+    # matches inactive secrets, so a non-NULL is_active in the result
+    # means exactly "registered but never finished MFA". Worst case used
+    # to be three SELECTs; now it is always one.
+    existing_user = (await db.execute(
+        select(
+            User.id, User.username, User.email, User.mfa_enabled,
+            MFASecret.is_active.label("incomplete_secret")
+        ).outerjoin(
+            MFASecret, and_(MFASecret.user_id == User.id, MFASecret.is_active == False)
+        ).where(
+            or_(User.username == user_data.username, User.email == user_data.email)
+        )
+    )).first()
     if existing_user:
+        # Which field collided? (username takes priority if both match)
+        field = "Username" if existing_user.username == user_data.username else "Email"
+
         # Check if user has incomplete MFA setup (registered but never completed MFA)
         if not existing_user.mfa_enabled:
-            incomplete_secret = db.query(MFASecret).filter(
-                MFASecret.user_id == existing_user.id,
-                MFASecret.is_active == False
-            ).first()
-            if incomplete_secret:
+            if existing_user.incomplete_secret is not None:
                 # User is in limbo state - has incomplete MFA setup
                 # Allow them to try again by directing them to complete MFA
                 raise HTTPException(
                     status_code=status.HTTP_409_CONFLICT,
-                    detail="Username already registered with incomplete MFA setup. Please login to complete MFA setup."
+                    detail=f"{field} already registered with incomplete MFA setup. Please login to complete MFA setup."
                 )
-        
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Username already registered"
-        )
-    
-    # Check if email already taken
-    existing_email = db.query(User).filter(User.email == user_data.email).first()
-    if existing_email:
-        # Check for incomplete MFA setup on email too
-        if not existing_email.mfa_enabled:
-            incomplete_secret = db.query(MFASecret).filter(
-                MFASecret.user_id == existing_email.id,
-                MFASecret.is_active == False
-            ).first()
-            if incomplete_secret:
-                raise HTTPException(
-                    status_code=status.HTTP_409_CONFLICT,
-                    detail="Email already registered with incomplete MFA setup. Please login to complete MFA setup."
-                )
-        
+
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Email already registered"
+            detail=f"{field} already registered"
         )
     
     # Hash the password
-    hashed_password = get_password_hash(user_data.password)
+    # bcrypt at cost=12 burns ~250ms of CPU - run it on the executor so
+    # the event loop keeps serving other requests in the meantime
+    hashed_password = await asyncio.to_thread(get_password_hash, user_data.password)
     
     # Create new user
+    # created_at/updated_at are stamped by the database (server_default)
     new_user = User(
         username=user_data.username,
         email=user_data.email,
         password_hash=hashed_password,
-        mfa_enabled=False,  # MFA disabled by default
-        created_at=datetime.now(timezone.utc),
-        updated_at=datetime.now(timezone.utc)
+        mfa_enabled=False  # MFA disabled by default
     )
     
     # Add to database
     db.add(new_user)
-    db.commit()  # Save to database
-    db.refresh(new_user)  # Reload to get generated ID
+    await db.commit()  # Save to database
+    await db.refresh(new_user)  # Reload to get generated ID
     
     return new_user
 
 
 @router.post("/login", response_model=Token)
-def login_user(user_credentials: UserLogin, db: Session = Depends(get_db)):
+@limiter.limit("10/minute")
+async def login_user(request: Request, user_credentials: UserLogin, db: AsyncSession = Depends(get_db)):
     """
     Login and receive JWT tokens.
     
@@ -125,24 +248,46 @@ def login_user(user_credentials: UserLogin, db: Session = Depends(get_db)):
         HTTPException 401: Invalid credentials
     """
     
-    # Find user by username
-    user = db.query(User).filter(User.username == user_credentials.username).first()
-    
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid username or password",
-            headers={"WWW-Authenticate": "Bearer"}  # Standard auth header
+    # Find user by username, pre-joining the MFA secret so the
+    # MFA-enabled branch below doesn't need a second round trip.
+    # load_only trims the SELECT to the columns login actually reads -
+    # the timestamps never leave the database. Deferred columns would
+    # lazy-load if touched, so keep the list in sync with this handler.
+    user = (await db.execute(
+        select(User).options(
+            load_only(User.id, User.username, User.email, User.password_hash, User.mfa_enabled),
+            joinedload(User.mfa_secret)
+        ).where(
+            User.username == user_credentials.username
         )
-    
-    # Verify password
-    if not verify_password(user_credentials.password, user.password_hash):
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid username or password",
-            headers={"WWW-Authenticate": "Bearer"}
-        )
-    
+    )).scalars().first()
+
+    # Everything login needs is loaded (load_only columns + the joined
+    # MFA secret), so hand the pooled connection back NOW instead of
+    # parking it under the ~100ms KDF below. Under concurrent logins the
+    # pool would otherwise drain with every connection pinned to a
+    # sleeping request. close() detaches the instances but their loaded
+    # attributes stay readable; the rehash branch re-attaches explicitly.
+    await db.close()
+
+    # Verify password - exactly one hash per login attempt, whether or
+    # not the username exists. Unknown users verify against the dummy
+    # hash, so both branches burn the same CPU (no timing oracle) and
+    # the thread pool sees a predictable load per request. The hashing
+    # runs off the event loop: the KDF releases the GIL in C, so
+    # concurrent logins use every core instead of blocking the loop.
+    target_hash = user.password_hash if user else _DUMMY_HASH
+    password_ok = await asyncio.to_thread(verify_password, user_credentials.password, target_hash)
+    if not user or not password_ok:
+        raise _BAD_CREDENTIALS
+
+    # Opportunistically upgrade legacy bcrypt (or weaker argon2) hashes
+    # now that we have the plain password in hand
+    if password_needs_rehash(user.password_hash):
+        user.password_hash = await asyncio.to_thread(get_password_hash, user_credentials.password)
+        db.add(user)  # re-attach the detached instance so the commit flushes
+        await db.commit()
+
     # TODO: If MFA enabled, require MFA token verification
     # For now, we'll skip MFA and just issue tokens
 
@@ -150,53 +295,51 @@ def login_user(user_credentials: UserLogin, db: Session = Depends(get_db)):
     if user.mfa_enabled:
         # MFA is enabled - token is required
         if not user_credentials.mfa_token:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="MFA token required. Please provide mfa_token in request body.",
-                headers={"WWW-Authenticate": "Bearer"}
-            )
-        
-        # Get user's MFA secret
-        mfa_secret = db.query(MFASecret).filter(
-            MFASecret.user_id == user.id,
-            MFASecret.is_active == True
-        ).first()
+            raise _MFA_TOKEN_REQUIRED
         
-        if not mfa_secret:
+        # Reject obviously malformed tokens before doing ANY crypto -
+        # a wrong-length or non-numeric token can never verify, so don't
+        # pay for AES decryption and HMACs to find that out. One shared
+        # Rust-side validator (same rule as TotpToken) does the check.
+        try:
+            MFA_TOKEN_VALIDATOR.validate_python(user_credentials.mfa_token)
+        except _CoreValidationError:
+            raise _INVALID_MFA_TOKEN
+
+        # Get user's MFA secret - already loaded by the joinedload above
+        mfa_secret = user.mfa_secret
+
+        if not mfa_secret or not mfa_secret.is_active:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="MFA configuration error. Please contact support."
             )
         
         # Decrypt and verify MFA token
-        decrypted_secret = decrypt_secret(mfa_secret.secret_key)
+        decrypted_secret = await _decrypted_secret_for(user.id, mfa_secret)
         if not verify_totp_token(decrypted_secret, user_credentials.mfa_token):
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid MFA token",
-                headers={"WWW-Authenticate": "Bearer"}
-            )
-    
-    # Create token payload
-    token_data = {
-        "sub": str(user.id),  # Subject: user ID
-        "username": user.username,
-        "mfa_enabled": user.mfa_enabled
-    }
-    
-    # Generate tokens
-    access_token = create_access_token(token_data)
-    refresh_token = create_refresh_token({"sub": str(user.id)})
-    
-    # Check if user has incomplete MFA setup (secret exists but not active)
-    incomplete_mfa = False
-    if not user.mfa_enabled:
-        incomplete_secret = db.query(MFASecret).filter(
-            MFASecret.user_id == user.id,
-            MFASecret.is_active == False
-        ).first()
-        if incomplete_secret:
-            incomplete_mfa = True
+            raise _INVALID_MFA_TOKEN
+    
+    # Generate tokens - claims go straight into the payload, no
+    # intermediate dict to copy. Compact claim names ("u"/"m") keep the
+    # token that ships on every request's Authorization header small;
+    # the response body below still carries the full field names.
+    access_token = create_access_token(
+        str(user.id),  # Subject: user ID
+        u=user.username,
+        m=user.mfa_enabled
+    )
+    refresh_token = create_refresh_token(str(user.id))
+    
+    # Check if user has incomplete MFA setup (secret exists but not active).
+    # The joinedload at the top already fetched the secret row, so this is
+    # a plain attribute read - no extra round trip
+    mfa_secret = user.mfa_secret
+    incomplete_mfa = (
+        not user.mfa_enabled
+        and mfa_secret is not None
+        and not mfa_secret.is_active
+    )
     
     return {
         "access_token": access_token,
@@ -213,10 +356,23 @@ def login_user(user_credentials: UserLogin, db: Session = Depends(get_db)):
 
 # ======================MFA Endpoints ============
 
-def get_current_user(
+def _extract_bearer(authorization: str) -> str:
+    """
+    Pull the token out of an "Authorization: Bearer <token>" header.
+
+    One length check + one slice comparison instead of str.split() -
+    no list allocation, and malformed headers are rejected in a single
+    branch. Scheme matching is case-insensitive per RFC 7235.
+    """
+    if len(authorization) < 8 or authorization[:7].lower() != "bearer ":
+        raise _BAD_AUTH_FORMAT
+    return authorization[7:]
+
+
+async def get_current_user(
         authorization: Optional[str] = Header(None),
-        db: Session = Depends(get_db)     
-                     
+        db: AsyncSession = Depends(get_db)
+
     ) -> User:
     """
     FastApi Dependency: Extract and validate user from Authorization header
@@ -250,56 +406,58 @@ def get_current_user(
 
     # Check if authorization header was provided
     if not authorization:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Authorization header missing", 
-            headers={"WWW-Authenticate": "Bearer"}
-
-        )
-    
-    #split "bearer token" into parts
-    parts = authorization.split()
-
-    #Validate format: exactly 2 parts, first is 'Bearer'
-    if len(parts) !=2 or parts[0].lower() != "bearer":
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid authorization header format. Expected: Bearer <token>",
-            headers={"WWW-Authenticate": "Bearer"}
-        )
-    #Extract token (second part)
-    token = parts[1]
-
-    #Decode JWT token
-    payload = decode_access_token(token)
-    if not payload:
-            raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid or expired token",
-            headers={"WWW-Authenticate": "Bearer"}
-        )
-
-    #Extract user ID from token payload
-    user_id = payload.get("sub")
-    if not user_id:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail = "Invalid token payload: missing user ID", 
-            headers={"WWW-Authenticate": "Bearer"}
-        )
+        raise _AUTH_HEADER_MISSING
+    
+    #Validate "Bearer <token>" format and extract the token
+    token = _extract_bearer(authorization)
+
+    #Seen this token recently? Skip straight to the primary-key fetch
+    cache_key = hashlib.blake2b(token.encode('utf-8'), digest_size=16).digest()
+    with _token_user_lock:
+        cached = _token_user_cache.get(cache_key)
+    if cached is not None:
+        cached_id, token_exp = cached
+        if token_exp > time.time():
+            #Session-level prefetch cache first (see routers/_userprefetch),
+            #then the identity-map-aware primary-key fetch
+            user = get_cached_user(db, cached_id) or await db.get(User, cached_id)
+            if user:
+                return user
+            #User deleted since the entry was cached - fall through and
+            #let the normal path produce the 404
+        else:
+            #Token expired since it was cached - drop the entry and take
+            #the full decode path, which rejects it
+            with _token_user_lock:
+                _token_user_cache.pop(cache_key, None)
+
+    #Decode JWT token and coerce the user id in one cached step
+    identity = decode_token_identity(token)
+    if identity is None:
+        #Error path only: re-decode (cached) to report the right reason
+        if not decode_access_token(token):
+            raise _INVALID_TOKEN
+        raise _MISSING_USER_ID
     #Find user in database
-    user = db.query(User).filter(User.id == int(user_id)).first()
+    user = (await db.execute(
+        select(User).where(User.id == identity.user_id)
+    )).scalars().first()
     if not user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="User not found"
-        )
+        raise _USER_NOT_FOUND
+
+    #Remember the resolution for the next request with this token. The
+    #exp read is a cache hit in decode_access_token - the identity step
+    #above just verified this token.
+    token_exp = (decode_access_token(token) or {}).get("exp", 0)
+    with _token_user_lock:
+        _token_user_cache[cache_key] = (user.id, token_exp)
+
     return user
 
 @router.post("/mfa/setup", response_model=MFASetupResponse)
-def setup_mfa(
+async def setup_mfa(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Setup MFA for authenticated user.
@@ -338,51 +496,65 @@ def setup_mfa(
     qr_code = generate_qr_code(totp_secret, current_user.username)
 
     #Step 4: Generate backup codes
-    # secrets.token_hex(4) = 8 random hex characters
-    # Use .upper() to make them easier to read 
-    backup_codes = [secrets.token_hex(4).upper() for _ in range(8)]
+    # One 32-byte CSPRNG draw sliced into 8 codes of 4 bytes each -
+    # same 8 hex chars per code as before, one urandom syscall instead
+    # of eight. Use .upper() to make them easier to read
+    raw = secrets.token_bytes(32)
+    backup_codes = [raw[i * 4:(i + 1) * 4].hex().upper() for i in range(8)]
 
     #step 5: Check is user already has MFA secret
-    existing_mfa = db.query(MFASecret).filter(
-        MFASecret.user_id == current_user.id
-    ).first()
+    existing_mfa = (await db.execute(
+        select(MFASecret).where(MFASecret.user_id == current_user.id)
+    )).scalars().first()
 
     if existing_mfa:
         #User is resetting MFA for example device is lost
         # Update existing record
         existing_mfa.secret_key = encrypted_secret
         existing_mfa.is_active = False  # Not active until verified
+        _drop_cached_secret(current_user.id)  # old plaintext is now stale
         existing_mfa.verified_at = None  # Clear previous verification
         existing_mfa.created_at = datetime.now(timezone.utc)  # New timestamp
         
         # Delete old backup codes
-        db.query(BackupCode).filter(BackupCode.user_id == current_user.id).delete()
+        await db.execute(delete(BackupCode).where(BackupCode.user_id == current_user.id))
     else:
         #First time MFA Setup - create new record
         new_mfa = MFASecret(
             user_id=current_user.id,
             secret_key=encrypted_secret,
             is_active=False,  # Not active until verified
-            verified_at=None,
-            created_at=datetime.now(timezone.utc)
-
+            verified_at=None  # created_at is stamped by the database
         )
         db.add(new_mfa)
     
     # Store hashed backup codes in database
-    for code in backup_codes:
-        # Hash backup code like a password
-        code_hash = bcrypt.hashpw(code.encode('utf-8'), bcrypt.gensalt(rounds=12)).decode('utf-8')
-        backup_code_record = BackupCode(
+    # Hash the 8 codes concurrently on the executor instead of serially
+    # on the event loop: bcrypt releases the GIL inside hashpw, so the
+    # wall time is one hash, not eight. Salts are drawn up front and
+    # zipped back so each code keeps its own unique salt.
+    salts = [bcrypt.gensalt(rounds=settings.backup_code_bcrypt_rounds) for _ in backup_codes]
+    hashes = await asyncio.gather(*(
+        asyncio.to_thread(bcrypt.hashpw, code.encode('utf-8'), salt)
+        for code, salt in zip(backup_codes, salts)
+    ))
+    # bulk_save_objects emits the 8 rows as one batched INSERT instead of
+    # unit-of-work bookkeeping + a statement per row. Safe here because
+    # nothing reads these instances back after the commit - the response
+    # returns the plaintext codes generated above
+    records = [
+        BackupCode(
             user_id=current_user.id,
-            code_hash=code_hash,
-            used=False,
-            created_at=datetime.now(timezone.utc)
+            code_hash=code_hash.decode('utf-8'),
+            lookup_hash=_backup_lookup_hash(code),
+            used=False
         )
-        db.add(backup_code_record)
-    
+        for code, code_hash in zip(backup_codes, hashes)
+    ]
+    await db.run_sync(lambda session: session.bulk_save_objects(records))
+
     # Save to database
-    db.commit()
+    await db.commit()
 
     # Return setup data
     # This is the only time backup codes are shown unencrypted
@@ -398,10 +570,10 @@ def setup_mfa(
 
 
 @router.post("/mfa/verify")
-def verify_mfa(
+async def verify_mfa(
     mfa_data: MFAVerify,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Verify and activate MFA.
@@ -434,73 +606,70 @@ def verify_mfa(
         HTTPException 400: No MFA setup found (must call /mfa/setup first)
         HTTPException 401: Invalid token (wrong code or expired)
     """
-    # Debug logging
-    print(f"DEBUG: Received MFA verify request for user {current_user.username}")
-    print(f"DEBUG: Token received: '{mfa_data.token}' (type: {type(mfa_data.token)}, length: {len(mfa_data.token)})")
-    
+    # %s-style args are only formatted when DEBUG is enabled, and the
+    # records drain through the QueueListener - zero I/O on this path
+    # in production
+    logger.debug("MFA verify request for user %s", current_user.username)
+
     # Ensure token is string and clean
     token = str(mfa_data.token).strip()
-    print(f"DEBUG: Cleaned token: '{token}' (length: {len(token)})")
-    
+
     # Validate token format
-    if len(token) != 6 or not token.isdigit():
-        print(f"DEBUG: Token validation failed - not 6 digits")
+    try:
+        MFA_TOKEN_VALIDATOR.validate_python(token)
+    except _CoreValidationError:
+        logger.debug("Token validation failed - not 6 digits")
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="MFA token must be exactly 6 digits"
         )
     
-    mfa_secret = db.query(MFASecret).filter(
-        MFASecret.user_id == current_user.id
-    ).first()
-    
+    mfa_secret = (await db.execute(
+        select(MFASecret).where(MFASecret.user_id == current_user.id)
+    )).scalars().first()
+
     if not mfa_secret:
-        print(f"DEBUG: No MFA secret found for user {current_user.id}")
+        logger.debug("No MFA secret found for user %s", current_user.id)
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="MFA not set up. Please call POST /api/auth/mfa/setup first"
         )
 
-    print(f"DEBUG: Found MFA secret, is_active={mfa_secret.is_active}")
-    
+    logger.debug("Found MFA secret, is_active=%s", mfa_secret.is_active)
+
     # Step 2: Decrypt the secret
     try:
-        decrypted_secret = decrypt_secret(mfa_secret.secret_key)
-        print(f"DEBUG: Successfully decrypted secret")
-    except Exception as e:
-        print(f"DEBUG: Failed to decrypt secret: {e}")
+        decrypted_secret = await _decrypted_secret_for(current_user.id, mfa_secret)
+    except Exception:
+        logger.exception("Failed to decrypt MFA secret for user %s", current_user.id)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to decrypt MFA secret"
         )
     
     # Step 3: Verify the token
-    print(f"DEBUG: Verifying TOTP token...")
     if not verify_totp_token(decrypted_secret, token):
-        print(f"DEBUG: TOTP verification failed")
+        logger.debug("TOTP verification failed for user %s", current_user.id)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid MFA token. Please check your authenticator app and try again."
         )
     
-    print(f"DEBUG: TOTP verification successful!")
-    
     # Step 4: Activate MFA
     # Mark secret as active and verified
     mfa_secret.is_active = True
     mfa_secret.verified_at = datetime.now(timezone.utc)
 
-    # Enable MFA for user account
+    # Enable MFA for user account (updated_at refreshes via onupdate)
     current_user.mfa_enabled = True
-    current_user.updated_at = datetime.now(timezone.utc)
 
     # Save changes
     try:
-        db.commit()
-        print(f"DEBUG: Successfully committed MFA activation for user {current_user.username}")
-    except Exception as e:
-        print(f"DEBUG: Failed to commit: {e}")
-        db.rollback()
+        await db.commit()
+        logger.debug("Committed MFA activation for user %s", current_user.username)
+    except Exception:
+        logger.exception("Failed to commit MFA activation for user %s", current_user.id)
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to save MFA activation"
@@ -514,10 +683,10 @@ def verify_mfa(
 
 
 @router.post("/mfa/disable")
-def disable_mfa(
+async def disable_mfa(
     mfa_data: MFAVerify,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Disable MFA for authenticated user.
@@ -558,10 +727,10 @@ def disable_mfa(
         )
     
     # Step 2: Get user's MFA secret
-    mfa_secret = db.query(MFASecret).filter(
-        MFASecret.user_id == current_user.id
-    ).first()
-    
+    mfa_secret = (await db.execute(
+        select(MFASecret).where(MFASecret.user_id == current_user.id)
+    )).scalars().first()
+
     if not mfa_secret:
         # Edge case: user.mfa_enabled is True but no secret exists
         # This shouldn't happen, but handle gracefully
@@ -571,8 +740,16 @@ def disable_mfa(
         )
     
     # Step 3: Decrypt and verify token
-    # User must prove they have access to authenticator
-    decrypted_secret = decrypt_secret(mfa_secret.secret_key)
+    # User must prove they have access to authenticator.
+    # Format check first - malformed tokens skip the crypto entirely
+    try:
+        MFA_TOKEN_VALIDATOR.validate_python(mfa_data.token)
+    except _CoreValidationError:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid MFA token. Cannot disable MFA without valid token."
+        )
+    decrypted_secret = await _decrypted_secret_for(current_user.id, mfa_secret)
     
     if not verify_totp_token(decrypted_secret, mfa_data.token):
         raise HTTPException(
@@ -582,14 +759,14 @@ def disable_mfa(
     
     # Step 4: Disable MFA
     # Delete the secret from database
-    db.delete(mfa_secret)
+    await db.delete(mfa_secret)
+    _drop_cached_secret(current_user.id)
     
-    # Update user record
+    # Update user record (updated_at refreshes via onupdate)
     current_user.mfa_enabled = False
-    current_user.updated_at = datetime.now(timezone.utc)
     
     # Save changes
-    db.commit()
+    await db.commit()
     
     # Success response
     return {
@@ -598,9 +775,11 @@ def disable_mfa(
     }
 
 @router.post("/mfa/verify-backup")
-def verify_backup_code(
+@limiter.limit("10/minute")
+async def verify_backup_code(
+    request: Request,
     backup_data: BackupCodeVerify,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Verify backup code for MFA recovery.
@@ -608,46 +787,76 @@ def verify_backup_code(
     Used when user loses access to authenticator app.
     Each backup code can only be used once.
     """
-    user = db.query(User).filter(User.username == backup_data.username).first()
+    user = (await db.execute(
+        select(User).where(User.username == backup_data.username)
+    )).scalars().first()
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
     
-    backup_codes = db.query(BackupCode).filter(
-        BackupCode.user_id == user.id,
-        BackupCode.used == False
-    ).all()
-    
-    if not backup_codes:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="No valid backup codes available"
+    # Indexed fast path: the peppered lookup hash pins the candidate row
+    # in one query, so we bcrypt-confirm exactly one hash instead of up
+    # to eight. Codes stored before lookup_hash existed have NULL there
+    # and fall back to the scan below.
+    matched_code = (await db.execute(
+        select(BackupCode).where(
+            BackupCode.user_id == user.id,
+            BackupCode.used == False,
+            BackupCode.lookup_hash == _backup_lookup_hash(backup_data.backup_code)
         )
-    
-    code_matched = False
-    matched_code = None
-    
-    for stored_code in backup_codes:
-        # code_hash is stored as string, backup_code needs to be bytes
-        if bcrypt.checkpw(backup_data.backup_code.encode('utf-8'), stored_code.code_hash.encode('utf-8')):
-            code_matched = True
-            matched_code = stored_code
-            break
-    
-    if not code_matched:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid backup code")
+    )).scalars().first()
+
+    if matched_code is not None:
+        # checkpw burns real CPU - keep it off the event loop
+        if not await asyncio.to_thread(bcrypt.checkpw, backup_data.backup_code.encode('utf-8'), matched_code.code_hash.encode('utf-8')):
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid backup code")
+    else:
+        # Legacy rows without a lookup hash: scan and confirm one by one
+        backup_codes = (await db.execute(
+            select(BackupCode).where(
+                BackupCode.user_id == user.id,
+                BackupCode.used == False,
+                BackupCode.lookup_hash.is_(None)
+            )
+        )).scalars().all()
+
+        if not backup_codes:
+            # No legacy rows either. If the user still holds unused
+            # hashed codes, the indexed miss above just means a wrong
+            # code was typed - report that, not an exhausted set.
+            has_unused = (await db.execute(
+                select(BackupCode.id).where(
+                    BackupCode.user_id == user.id,
+                    BackupCode.used == False
+                ).limit(1)
+            )).first()
+            if has_unused:
+                raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid backup code")
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="No valid backup codes available"
+            )
+
+        for stored_code in backup_codes:
+            # code_hash is stored as string, backup_code needs to be bytes
+            if await asyncio.to_thread(bcrypt.checkpw, backup_data.backup_code.encode('utf-8'), stored_code.code_hash.encode('utf-8')):
+                matched_code = stored_code
+                break
+
+        if matched_code is None:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid backup code")
     
     # Mark code as used
     matched_code.used = True
     matched_code.used_at = datetime.now(timezone.utc)
-    db.commit()
+    await db.commit()
     
     # Create temporary token for MFA reset (10 minutes)
-    token_data = {
-        "sub": str(user.id),
-        "username": user.username,
-        "mfa_enabled": user.mfa_enabled
-    }
-    temp_token = create_access_token(token_data, expires_delta=timedelta(minutes=10))
+    temp_token = create_access_token(
+        str(user.id),
+        expires_delta=timedelta(minutes=10),
+        u=user.username,
+        m=user.mfa_enabled
+    )
     
     return {
         "message": "Backup code verified successfully",
@@ -657,15 +866,17 @@ def verify_backup_code(
 
 
 @router.post("/mfa/reset")
-def reset_mfa(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def reset_mfa(current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
     """Reset MFA after backup code verification."""
-    mfa_secret = db.query(MFASecret).filter(MFASecret.user_id == current_user.id).first()
+    mfa_secret = (await db.execute(
+        select(MFASecret).where(MFASecret.user_id == current_user.id)
+    )).scalars().first()
     if mfa_secret:
-        db.delete(mfa_secret)
+        await db.delete(mfa_secret)
+    _drop_cached_secret(current_user.id)
     
-    db.query(BackupCode).filter(BackupCode.user_id == current_user.id).delete()
+    await db.execute(delete(BackupCode).where(BackupCode.user_id == current_user.id))
     current_user.mfa_enabled = False
-    current_user.updated_at = datetime.now(timezone.utc)
-    db.commit()
+    await db.commit()
     
     return {"message": "MFA reset successfully. Please set up MFA again.", "mfa_enabled": False}
@@ -1,16 +1,26 @@
 # Quick test to create tables
+import asyncio
+
 from database import init_db, engine
-from sqlalchemy import inspect
 
-print("Testing database connection...")
-print(f"Database URL: {engine.url}")
 
-print("\nCreating tables...")
-init_db()
+async def main():
+    print("Testing database connection...")
+    print(f"Database URL: {engine.url}")
+
+    print("\nCreating tables...")
+    await init_db()
+
+    print("\nChecking created tables...")
+    # Ask the dialect directly instead of building an Inspector - one
+    # catalog query, none of the reflection framework's setup
+    async with engine.connect() as conn:
+        tables = await conn.run_sync(
+            lambda sync_conn: engine.dialect.get_table_names(sync_conn)
+        )
+    print(f"Tables created: {tables}")
+
+    print("\n✅ Success! Database setup complete!")
 
-print("\nChecking created tables...")
-inspector = inspect(engine)
-tables = inspector.get_table_names()
-print(f"Tables created: {tables}")
 
-print("\n✅ Success! Database setup complete!")
\ No newline at end of file
+asyncio.run(main())
@@ -0,0 +1,158 @@
+# Manual test script for the auth flows the frontend exercises.
+# Run the API first (uvicorn main:app --reload), then: python test_frontend_auth.py
+import asyncio
+import os
+import secrets
+import sys
+import time
+
+import httpx
+import orjson
+
+# Serialize payloads with orjson - same library the API uses for
+# responses - and send pre-encoded bytes so httpx skips stdlib json
+_JSON_HEADERS = {"Content-Type": "application/json", "Accept": "application/json"}
+
+# One pooled client for the whole run - every request reuses the same
+# keep-alive connection instead of paying TCP setup per call, which is
+# also how the browser talks to the API. Async so independent checks can
+# run concurrently via asyncio.gather, exercising the server the way
+# real overlapping frontend traffic does. The JSON headers are set once
+# on the client, so per-call header merging is skipped entirely.
+client = httpx.AsyncClient(
+    base_url="http://localhost:8000", timeout=5.0, headers=_JSON_HEADERS
+)
+
+# Wall-clock via time.monotonic - immune to clock adjustments and no
+# datetime allocation/strftime per timestamp
+_T0 = time.monotonic()
+
+# The frontend-format probe sends the identical body on every run -
+# build and serialize it once at import; the request loop just ships
+# the prepared bytes
+_FRONTEND_LOGIN_PAYLOAD = {
+    "username": "definitely_not_a_user",
+    "password": "WrongPass123",
+    "mfa_token": None
+}
+_FRONTEND_LOGIN_BYTES = orjson.dumps(_FRONTEND_LOGIN_PAYLOAD)
+
+
+async def post_json(path: str, payload: dict) -> httpx.Response:
+    """POST a JSON payload through the shared client via orjson."""
+    return await client.post(path, content=orjson.dumps(payload))
+
+
+def pretty(response: httpx.Response) -> str:
+    """Re-indent a JSON response body for readable output."""
+    try:
+        return orjson.dumps(response.json(), option=orjson.OPT_INDENT_2).decode()
+    except ValueError:
+        return response.text
+
+
+async def test_health():
+    """API up and reachable?"""
+    print("Checking API health...")
+    response = await client.get("/api/health")
+    print(f"  /api/health -> {response.status_code} {response.json()}")
+    return response.status_code == 200
+
+
+async def test_register_and_login():
+    """Register a throwaway user and log in without MFA."""
+    username = f"testuser_{secrets.token_hex(4)}"
+    password = "TestPass123"
+
+    print(f"\nRegistering {username}...")
+    response = await post_json("/api/auth/register", {
+        "username": username,
+        "email": f"{username}@example.com",
+        "password": password
+    })
+    print(f"  register -> {response.status_code}")
+    if response.status_code != 201:
+        print(f"  body: {pretty(response)}")
+        return False
+
+    print(f"Logging in as {username} (no MFA)...")
+    response = await post_json("/api/auth/login", {
+        "username": username,
+        "password": password
+    })
+    print(f"  login -> {response.status_code}")
+    if response.status_code != 200:
+        print(f"  body: {pretty(response)}")
+        return False
+
+    data = response.json()
+    print(f"  token_type: {data['token_type']}")
+    print(f"  user: {data['user']}")
+    return "access_token" in data
+
+
+async def test_frontend_login_format():
+    """Login payload exactly as the frontend sends it (mfa_token: null)."""
+    print("\nLogin with explicit null mfa_token (frontend format)...")
+    response = await client.post("/api/auth/login", content=_FRONTEND_LOGIN_BYTES)
+    # Expect a clean 401, not a 422 - null must be accepted by validation
+    print(f"  login -> {response.status_code} (expected 401)")
+    return response.status_code == 401
+
+
+async def test_mfa_login_interactive():
+    """Full MFA login - needs a real account and authenticator app.
+
+    Set MFA_USERNAME, MFA_PASSWORD and MFA_SECRET in the environment to
+    run this without prompts (e.g. from CI or a shell loop) - the
+    current code is derived from the secret instead of typed in.
+    """
+    username = os.environ.get("MFA_USERNAME")
+    password = os.environ.get("MFA_PASSWORD")
+    mfa_secret = os.environ.get("MFA_SECRET")
+    if username and password and mfa_secret:
+        import pyotp
+        mfa_token = pyotp.TOTP(mfa_secret).now()
+        print(f"\n--- MFA login (non-interactive, code derived from MFA_SECRET) ---")
+    else:
+        print("\n--- Interactive MFA login ---")
+        username = input("Username (blank to skip): ").strip()
+        if not username:
+            print("  skipped")
+            return True
+        password = input("Password: ").strip()
+        mfa_token = input("6-digit MFA code: ").strip()
+
+    response = await post_json("/api/auth/login", {
+        "username": username,
+        "password": password,
+        "mfa_token": mfa_token
+    })
+    print(f"  login -> {response.status_code}")
+    print(f"  body: {pretty(response)}")
+    return response.status_code == 200
+
+
+async def main() -> int:
+    if not await test_health():
+        print("\n❌ API is not responding - start it with: uvicorn main:app --reload")
+        return 1
+
+    # The two non-interactive flows don't depend on each other - fire
+    # them concurrently over the shared connection pool
+    results = await asyncio.gather(
+        test_register_and_login(),
+        test_frontend_login_format(),
+    )
+    ok = all(results)
+    ok = await test_mfa_login_interactive() and ok
+
+    elapsed = time.monotonic() - _T0
+    print(f"\n✅ All checks passed! ({elapsed:.2f}s)" if ok
+          else f"\n❌ Some checks failed ({elapsed:.2f}s)")
+    await client.aclose()
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))